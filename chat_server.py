@@ -1,143 +1,331 @@
 """
 Multi-Client Chat Server
 Handles multiple clients simultaneously and broadcasts messages to all connected clients.
+Uses a single asyncio event loop to multiplex all client sockets instead of one thread per client
+(the loop rides on the selectors module, so epoll on Linux and kqueue on BSD/macOS).
 Usage: python chat_server.py <host> <port>
 Example: python chat_server.py 192.168.1.100 5000
 """
 
+import asyncio
+import logging
+import os
 import socket
-import threading
 import sys
 
+log = logging.getLogger("chat")
+
+#Socket buffer size for accepted connections (1 MiB)
+SOCKET_BUFFER_SIZE = 1 << 20
+
+#Pending-connection queue; the event loop also drains up to this many
+#accepts per wakeup, so a reconnect storm costs ~1 poll instead of N
+LISTEN_BACKLOG = 128
+
+#Hard cap on simultaneous clients; extra connections are turned away
+MAX_CONNECTIONS = 256
+
+#Largest payload the 2-byte frame header can describe
+MAX_FRAME = 65535
+
+#Longest accepted nickname, so the prefix and notice templates always fit
+MAX_NICKNAME = 64
+
+#Pre-encoded message templates; bytes %-formatting skips the
+#str-build-then-encode round trip on the connection setup path
+WELCOME_FMT = b"Welcome %s! You are now connected. Type messages to chat."
+JOIN_FMT = b"*** %s has joined the chat ***"
+LEAVE_FMT = b"*** %s has left the chat ***"
+SERVER_FULL_MSG = b"Server is full, please try again later."
+TOO_LONG_MSG = b"Message too long to relay."
+
+def frame(payload):
+    """Prefix a payload with its 2-byte big-endian length."""
+    return len(payload).to_bytes(2, 'big') + payload
+
+async def read_frame(reader):
+    """Read one length-prefixed frame; returns b'' when the peer disconnects."""
+    try:
+        header = await reader.readexactly(2)
+        length = int.from_bytes(header, 'big')
+        return await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return b''
+
+def tune_socket(sock):
+    """Disable Nagle and enlarge kernel buffers to cut small-message latency."""
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    if hasattr(socket, 'TCP_QUICKACK'):
+        #Linux only: ack immediately instead of delaying
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+
+#How long outgoing messages may accumulate before a coalesced flush
+FLUSH_DELAY = 0.001
+
+#Payloads past this size go out via sendfile from a memfd instead of
+#being copied from userspace once per recipient
+LARGE_PAYLOAD = 4096
+
+class ClientState:
+    """Per-connection bookkeeping: nickname plus pending coalesced writes."""
+    def __init__(self, nickname):
+        self.nickname = nickname
+        #"[nickname] " encoded once at join; relayed messages reuse it
+        self.prefix = f"[{nickname}] ".encode('utf-8')
+        #Framed messages waiting for the next coalesced flush
+        self.pending = []
+        #Timer handle for the scheduled flush, None when no window is open
+        self.flush_handle = None
+
 class ChatServer:
-    """Constructor (sets host, port, TCP & IP, reuse options, default clients, sets lock)"""
+    """Constructor (sets host, port, default clients)"""
     def __init__(self, host, port):
         self.host = host
         self.port = port
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.clients = {}  
-        self.lock = threading.Lock()
-        print(f"Server object created with host={host}, port={port}")
-   
-    """Send a message to all connected clients except the sender."""
-    def broadcast(self, message, sender_socket=None):
-        with self.lock:
-            client_count = len(self.clients)
-            print(f"Number of connected clients: {client_count}")
-            for client_socket in list(self.clients.keys()):
-                if client_socket != sender_socket:
-                    try:
-                        #Sockets only send bytes, not strings
-                        client_socket.send(message.encode('utf-8'))
-                        print(f"Sent to {self.clients[client_socket]}")
-                    except Exception as e:
-                        print(f"Failed to send to client: {e}")
-                        self.remove_client(client_socket)
-   
-    def remove_client(self, client_socket):
+        self.clients = {}
+        #Published copy-on-write snapshot of (writer, state) pairs; broadcast
+        #iterates this tuple so add/remove during an await never disturbs it
+        self._clients_snapshot = ()
+        log.debug("Server object created with host=%s, port=%s", host, port)
+
+    """Send already-encoded message parts to all connected clients except the sender."""
+    async def broadcast(self, parts, sender_writer=None):
+        log.debug("Number of connected clients: %d", len(self.clients))
+        #Header computed once; the parts go out as an iovec, never joined
+        payload_len = sum(len(part) for part in parts)
+        frames = (payload_len.to_bytes(2, 'big'),) + tuple(parts)
+        if payload_len + 2 > LARGE_PAYLOAD and hasattr(os, 'memfd_create'):
+            await self._broadcast_large(b''.join(frames), sender_writer)
+            return
+        recipients = []
+        #Grab the current snapshot; no per-broadcast list allocation needed
+        for writer, state in self._clients_snapshot:
+            if writer != sender_writer:
+                try:
+                    self._enqueue(writer, state, frames)
+                    recipients.append(writer)
+                    log.debug("Sent to %s", state.nickname)
+                except Exception as e:
+                    log.warning("Failed to send to client: %s", e)
+                    self.remove_client(writer)
+        #Apply backpressure only after every recipient has the bytes queued
+        for writer in recipients:
+            try:
+                await writer.drain()
+            except Exception as e:
+                log.warning("Failed to send to client: %s", e)
+                self.remove_client(writer)
+
+    async def _broadcast_large(self, framed, sender_writer):
+        """Fan out a large framed payload via sendfile from a shared memfd."""
+        #Stage the bytes once in an in-memory file; each recipient then pulls
+        #pages from it in the kernel instead of copying from userspace
+        memfd = os.memfd_create("bcast", os.MFD_CLOEXEC)
+        try:
+            os.write(memfd, framed)
+            recipients = []
+            for writer, state in self._clients_snapshot:
+                if writer == sender_writer:
+                    continue
+                try:
+                    #Close any open coalescing window so ordering is preserved
+                    if state.flush_handle is not None:
+                        state.flush_handle.cancel()
+                    self._flush(writer, state)
+                    if writer.transport.get_write_buffer_size() == 0:
+                        self._sendfile_all(writer, memfd, len(framed))
+                    else:
+                        #Transport still has queued bytes: stay on its path
+                        writer.write(framed)
+                    recipients.append(writer)
+                except Exception as e:
+                    log.warning("Failed to send to client: %s", e)
+                    self.remove_client(writer)
+            for writer in recipients:
+                try:
+                    await writer.drain()
+                except Exception as e:
+                    log.warning("Failed to send to client: %s", e)
+                    self.remove_client(writer)
+        finally:
+            os.close(memfd)
+
+    def _sendfile_all(self, writer, memfd, length):
+        """Push length bytes from memfd to the client socket via sendfile."""
+        sock = writer.get_extra_info('socket')
+        offset = 0
+        while offset < length:
+            try:
+                sent = os.sendfile(sock.fileno(), memfd, offset, length - offset)
+            except BlockingIOError:
+                #Kernel send buffer is full; hand the tail to the transport
+                writer.write(os.pread(memfd, length - offset, offset))
+                return
+            if sent == 0:
+                raise ConnectionResetError("sendfile returned 0")
+            offset += sent
+
+    def _enqueue(self, writer, state, frames):
+        """Queue one framed message, coalescing bursts into a single flush."""
+        if state.flush_handle is None:
+            #Low-load fast path: send right away, then open a short window so
+            #any burst arriving within FLUSH_DELAY goes out as one flush
+            writer.writelines(frames)
+            loop = asyncio.get_running_loop()
+            state.flush_handle = loop.call_later(FLUSH_DELAY, self._flush, writer, state)
+        else:
+            state.pending.extend(frames)
+
+    def _flush(self, writer, state):
+        """Flush any messages that accumulated during the coalescing window."""
+        state.flush_handle = None
+        if not state.pending:
+            return
+        try:
+            #Vectored write: one transport submission for the whole burst
+            writer.writelines(state.pending)
+        except Exception as e:
+            log.warning("Failed to send to client: %s", e)
+            self.remove_client(writer)
+        state.pending.clear()
+
+    def add_client(self, writer, nickname):
+        """Add a client and publish a fresh snapshot; returns its state."""
+        state = ClientState(nickname)
+        self.clients[writer] = state
+        self._clients_snapshot = tuple(self.clients.items())
+        return state
+
+    def remove_client(self, writer):
         """Remove a client from the server."""
-        with self.lock:
-            if client_socket in self.clients:
-                nickname = self.clients[client_socket]
-                del self.clients[client_socket]
-                client_socket.close()
-                print(f"Removed client: {nickname}")
-                return nickname
+        if writer in self.clients:
+            state = self.clients[writer]
+            del self.clients[writer]
+            self._clients_snapshot = tuple(self.clients.items())
+            if state.flush_handle is not None:
+                state.flush_handle.cancel()
+            writer.close()
+            log.debug("Removed client: %s", state.nickname)
+            return state.nickname
         return None
-   
-    def handle_client(self, client_socket, client_address):
+
+    async def handle_client(self, reader, writer):
         """Handle messages from a single client."""
+        client_address = writer.get_extra_info('peername')
+        log.debug("New connection from %s", client_address)
+        #Backpressure: turn away connections past the cap instead of letting
+        #an unbounded client count exhaust server memory
+        if len(self.clients) >= MAX_CONNECTIONS:
+            log.warning("Rejecting %s: server full (%d clients)",
+                        client_address, len(self.clients))
+            try:
+                writer.write(frame(SERVER_FULL_MSG))
+                await writer.drain()
+            except Exception:
+                pass
+            writer.close()
+            return
         try:
-            #Get client nickname
-            client_socket.send("NICKNAME_REQUEST".encode('utf-8'))
-            #Reads 1024 bytes (strip removes whitespace)
-            nickname = client_socket.recv(1024).decode('utf-8').strip()
-            print(f"Received nickname: '{nickname}' from {client_address}")
-           
+            #Without TCP_NODELAY a short chat line can sit 40 ms in the kernel
+            tune_socket(writer.get_extra_info('socket'))
+            #The client opens with its nickname as the first frame, so the
+            #handshake costs one round-trip instead of three
+            data = await read_frame(reader)
+            nickname = data.decode('utf-8').strip()
+            log.debug("Received nickname: %r from %s", nickname, client_address)
+
             if not nickname:
                 nickname = f"User_{client_address[1]}"
-           
-            with self.lock:
-                self.clients[client_socket] = nickname
-                print(f"Added {nickname} to clients dict. Total clients: {len(self.clients)}")
-           
-            welcome_msg = f"Welcome {nickname}! You are now connected. Type messages to chat."
-            client_socket.send(welcome_msg.encode('utf-8'))
-           
-            join_msg = f"*** {nickname} has joined the chat ***"
-            print(join_msg)
+            #Bound the nickname so the cached prefix and notices always frame
+            nickname = nickname[:MAX_NICKNAME]
+
+            #All mutations happen on the loop thread, so no lock is needed
+            state = self.add_client(writer, nickname)
+            log.debug("Added %s to clients dict. Total clients: %d", nickname, len(self.clients))
+
+            #Encode the nickname once; the templates are already bytes
+            nick_bytes = nickname.encode('utf-8')
+            writer.write(frame(WELCOME_FMT % nick_bytes))
+            await writer.drain()
+
+            log.info("*** %s has joined the chat ***", nickname)
             #Send to all except new client
-            self.broadcast(join_msg, client_socket)
-           
-            # Handle messages
-            while True:
-                print(f"Waiting for message from {nickname}...")
-                data = client_socket.recv(1024)
+            await self.broadcast([JOIN_FMT % nick_bytes], writer)
+
+            # Handle messages, draining every buffered frame per wakeup so a
+            # burst from one client costs one read instead of one per frame
+            buf = bytearray()
+            quitting = False
+            while not quitting:
+                chunk = await reader.read(65536)
                 #Client disconnects
-                if not data:
-                    print(f"No data received from {nickname}, client disconnected")
-                    break
-               
-                message = data.decode('utf-8').strip()
-               
-                if message.lower() == '/quit':
+                if not chunk:
+                    log.debug("No data received from %s, client disconnected", nickname)
                     break
-               
-                formatted_msg = f"[{nickname}] {message}"
-                print(formatted_msg)
-                self.broadcast(formatted_msg, client_socket)
-               
+                buf += chunk
+
+                #Parse all complete frames already in userspace before waiting
+                offset = 0
+                while len(buf) - offset >= 2:
+                    length = int.from_bytes(buf[offset:offset + 2], 'big')
+                    if len(buf) - offset < 2 + length:
+                        break
+                    stripped = bytes(buf[offset + 2:offset + 2 + length]).strip()
+                    offset += 2 + length
+
+                    #Compare on bytes so no lowercase str is allocated per message
+                    if stripped.lower() == b'/quit':
+                        quitting = True
+                        break
+
+                    #The relayed frame carries the prefix too; a payload that
+                    #overflows the header must be refused, not let it raise
+                    if len(state.prefix) + len(stripped) > MAX_FRAME:
+                        writer.write(frame(TOO_LONG_MSG))
+                        await writer.drain()
+                        continue
+
+                    log.debug("[%s] %s", nickname, stripped)
+                    #Cached prefix plus the raw payload: no per-message f-string,
+                    #no decode, no re-encode on the relay path
+                    await self.broadcast([state.prefix, stripped], writer)
+                #Compact any partial-frame residue to the front of the buffer
+                del buf[:offset]
+
         except ConnectionResetError:
-            print(f"Connection reset by client {client_address}")
+            log.warning("Connection reset by client %s", client_address)
         except Exception as e:
-            print(f"Error handling client {client_address}: {e}")
+            log.warning("Error handling client %s: %s", client_address, e)
         finally:
-            nickname = self.remove_client(client_socket)
+            nickname = self.remove_client(writer)
             if nickname:
-                leave_msg = f"*** {nickname} has left the chat ***"
-                print(leave_msg)
-                self.broadcast(leave_msg)
-   
-    def start(self):
+                log.info("*** %s has left the chat ***", nickname)
+                await self.broadcast([LEAVE_FMT % nickname.encode('utf-8')])
+
+    async def start(self):
         """Start the chat server."""
         try:
-            self.server_socket.bind((self.host, self.port))
+            server = await asyncio.start_server(
+                self.handle_client, self.host, self.port, backlog=LISTEN_BACKLOG)
             print(f"Bind successful")
-           
-            #Listens for connection attempts (up to 10 in queue)
-            self.server_socket.listen(10)
-           
+
             print(f"\n{'='*50}")
             print(f"Chat server started on {self.host}:{self.port}")
             print(f"Waiting for clients to connect...")
             print(f"{'='*50}\n")
-           
-            while True:
-                #Waits for client to connect and stores their info
-                client_socket, client_address = self.server_socket.accept()
-                print(f"New connection from {client_address}")
-               
-                thread = threading.Thread(
-                    target=self.handle_client,
-                    args=(client_socket, client_address),
-                    #Thread ends when program stops
-                    daemon=True
-                )
-                thread.start()
-               
-        #Allows ending with Ctrl+C
-        except KeyboardInterrupt:
-            print("\nKeyboardInterrupt received")
-            print("Server shutting down...")
+
+            async with server:
+                await server.serve_forever()
+
         except OSError as e:
             print(f"OSError: {e}")
             print(f"Error: {e}")
         finally:
-            with self.lock:
-                for client_socket in list(self.clients.keys()):
-                    client_socket.close()
-            self.server_socket.close()
+            #The published snapshot is already an immutable tuple
+            for writer, _ in self._clients_snapshot:
+                writer.close()
             print(f"Server socket closed")
 
 def print_usage():
@@ -150,7 +338,7 @@ if __name__ == "__main__":
         print("Error: Host and port are required!")
         print_usage()
         sys.exit(1)
-   
+
     host = sys.argv[1]
     try:
         port = int(sys.argv[2])
@@ -158,7 +346,14 @@ if __name__ == "__main__":
         print(f"Error: Port must be a number, got '{sys.argv[2]}'")
         print_usage()
         sys.exit(1)
-   
-    print(f"[DEBUG] Starting server with host={host}, port={port}")
+
+    #Per-message diagnostics stay off unless CHAT_DEBUG=1 is set
+    debug = os.environ.get("CHAT_DEBUG") == "1"
+    logging.basicConfig(level=logging.DEBUG if debug else logging.WARNING)
     server = ChatServer(host=host, port=port)
-    server.start()
\ No newline at end of file
+    try:
+        #Allows ending with Ctrl+C
+        asyncio.run(server.start())
+    except KeyboardInterrupt:
+        print("\nKeyboardInterrupt received")
+        print("Server shutting down...")
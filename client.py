@@ -2,117 +2,139 @@
 """
 Chat Client
 Connects to the chat server and allows sending/receiving messages.
-Uses threading to receive messages while waiting for user input.
+Uses a single asyncio event loop for both the socket and user input,
+so no separate receive thread is needed.
 Usage: python client.py <host> <port>
 Example: python client.py 192.168.1.100 5000
 """
 
+import asyncio
+import logging
+import os
 import socket
-import threading
 import sys
 
+log = logging.getLogger("chat.client")
+
+def frame(payload):
+    """Prefix a payload with its 2-byte big-endian length."""
+    return len(payload).to_bytes(2, 'big') + payload
+
+async def read_frame(reader):
+    """Read one length-prefixed frame; returns b'' when the peer disconnects."""
+    try:
+        header = await reader.readexactly(2)
+        length = int.from_bytes(header, 'big')
+        return await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return b''
+
+async def ainput(prompt):
+    """Read one line from stdin without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, input, prompt)
+
 class ChatClient:
     def __init__(self, host, port):
         self.host = host
         self.port = port
-        self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.running = True
         self.nickname = None
-   
-    def receive_messages(self):
+        #Set once the connection should shut down
+        self.stopped = asyncio.Event()
+
+    async def receive_messages(self, reader):
         """Continuously receive messages from the server."""
-        print(f"[DEBUG] receive_messages thread started")
-        while self.running:
+        log.debug("receive loop started")
+        while not self.stopped.is_set():
             try:
-                data = self.client_socket.recv(1024)
+                data = await read_frame(reader)
                 if not data:
                     print("\nDisconnected from server.")
-                    self.running = False
+                    self.stopped.set()
                     break
                 #Goes from byte to string
                 message = data.decode('utf-8')
-               
-                # Handle nickname request from server
-                if message == "NICKNAME_REQUEST":
-                    #.strip removes whitespace to read-in
-                    nickname = input("Enter your nickname: ").strip()
-                    if not nickname:
-                        nickname = "Anonymous"
-                    self.nickname = nickname
-                    #Sends nickname as a byte stream
-                    self.client_socket.send(nickname.encode('utf-8'))
-                else:
-                    # Regular message - print it
-                    print(f"\n{message}")
-                    print("You: ", end="", flush=True)
-                   
+
+                # Regular message - print it
+                print(f"\n{message}")
+                print("You: ", end="", flush=True)
+
             except ConnectionResetError:
                 print("\nConnection lost.")
-                self.running = False
+                self.stopped.set()
                 break
             except OSError as e:
-                if self.running:
-                    print(f"OSError in receive: {e}")
+                if not self.stopped.is_set():
+                    log.warning("OSError in receive: %s", e)
                 break
             except Exception as e:
-                print(f"Error receiving: {e}")
-                if self.running:
-                    self.running = False
+                log.warning("Error receiving: %s", e)
+                self.stopped.set()
                 break
 
-   
-    def send_messages(self):
+    async def send_messages(self, writer):
         """Handle user input and send messages to the server."""
-       
-        # Wait a moment for nickname exchange to complete
-        import time
-        time.sleep(0.5)
-       
-        while self.running:
+        while not self.stopped.is_set():
             try:
-                message = input("You: ")
+                message = await ainput("You: ")
                 #Handles connection errors
-                if not self.running:
+                if self.stopped.is_set():
                     break
-               
-                if message.lower() == '/quit':
-                    self.client_socket.send(message.encode('utf-8'))
-                    self.running = False
+
+                #Only lowercase when the length can match; skips the
+                #allocation for ordinary chat lines
+                if len(message) == 5 and message.lower() == '/quit':
+                    writer.write(frame(message.encode('utf-8')))
+                    await writer.drain()
+                    self.stopped.set()
                     break
-               
+
                 if message:
-                    self.client_socket.send(message.encode('utf-8'))
-                   
+                    writer.write(frame(message.encode('utf-8')))
+                    await writer.drain()
+
             except EOFError:
-                print(f"\nEOFError, exiting")
-                self.running = False
+                log.debug("EOFError, exiting")
+                self.stopped.set()
                 break
             except Exception as e:
-                print(f"Error sending: {e}")
-                if self.running:
-                    self.running = False
+                log.warning("Error sending: %s", e)
+                self.stopped.set()
                 break
-    
-   
-    def connect(self):
+
+    async def connect(self):
         """Connect to the server and start communication."""
+        writer = None
+        receive_task = None
         try:
-            self.client_socket.connect((self.host, self.port))
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+            sock = writer.get_extra_info('socket')
+            #Disable Nagle so short chat lines are not delayed for coalescing
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if hasattr(socket, 'TCP_QUICKACK'):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
             print(f"Connected successfully to {self.host}:{self.port}")
-           
+
             print(f"\n{'='*50}")
             print(f"Connected to server at {self.host}:{self.port}")
             print(f"Type '/quit' to exit")
             print(f"{'='*50}\n")
-           
-            # Start receive thread
-            #Thread ends when program stops
-            receive_thread = threading.Thread(target=self.receive_messages, daemon=True)
-            receive_thread.start()
-           
-            # Send messages in main thread
-            self.send_messages()
-           
+
+            #Open with the nickname so the server needs no request probe
+            nickname = (await ainput("Enter your nickname: ")).strip()
+            if not nickname:
+                nickname = "Anonymous"
+            self.nickname = nickname
+            writer.write(frame(nickname.encode('utf-8')))
+            await writer.drain()
+
+            # Receive messages as a task on the same loop
+            receive_task = asyncio.create_task(self.receive_messages(reader))
+
+            # Handle user input in the main coroutine
+            await self.send_messages(writer)
+
         except ConnectionRefusedError:
             print(f"Error: Could not connect to server at {self.host}:{self.port}")
             print("Make sure the server is running and the address is correct.")
@@ -121,9 +143,12 @@ class ChatClient:
         except Exception as e:
             print(f"Error: {e}")
         finally:
-            self.running = False
-            self.client_socket.close()
-            print(f"Client socket closed")
+            self.stopped.set()
+            if receive_task is not None:
+                receive_task.cancel()
+            if writer is not None:
+                writer.close()
+            log.debug("Client socket closed")
             print("Goodbye!")
 
 def print_usage():
@@ -135,7 +160,7 @@ if __name__ == "__main__":
         print("Error: Host and port are required!")
         print_usage()
         sys.exit(1)
-   
+
     host = sys.argv[1]
     try:
         port = int(sys.argv[2])
@@ -143,6 +168,9 @@ if __name__ == "__main__":
         print(f"Error: Port must be a number, got '{sys.argv[2]}'")
         print_usage()
         sys.exit(1)
-   
+
+    #Per-message diagnostics stay off unless CHAT_DEBUG=1 is set
+    debug = os.environ.get("CHAT_DEBUG") == "1"
+    logging.basicConfig(level=logging.DEBUG if debug else logging.WARNING)
     client = ChatClient(host=host, port=port)
-    client.connect()
+    asyncio.run(client.connect())
@@ -0,0 +1,333 @@
+"""
+Experimental io_uring Chat Server
+Alternative to chat_server.py that drives all client sockets through a single
+io_uring instance with multishot recv, so idle connections cost no syscalls:
+the kernel posts completions into the ring without a recv() per message.
+Requires the optional python-liburing package and a recent Linux kernel.
+Usage: python uring_server.py <host> <port>
+Example: python uring_server.py 192.168.1.100 5000
+"""
+
+import errno
+import logging
+import os
+import socket
+import sys
+
+log = logging.getLogger("chat")
+
+try:
+    import liburing
+except ImportError:
+    liburing = None
+
+#Ring-provided buffer pool: the kernel picks a free buffer per completion
+BUFFER_GROUP = 0
+BUFFER_SIZE = 1024
+BUFFER_COUNT = 256
+
+#Size of the registered-file table; one slot per live client fd
+MAX_CLIENTS = 1024
+
+#Largest payload the 2-byte frame header can describe
+MAX_FRAME = 65535
+
+#Longest accepted nickname, so the prefix and notices always fit the header
+MAX_NICKNAME = 64
+
+TOO_LONG_MSG = b"Message too long to relay."
+
+#CQE user_data is (kind << 32) | value so completions can be told apart
+KIND_SEND = 0
+KIND_ACCEPT = 1
+KIND_RECV = 2
+
+def tag(kind, value=0):
+    return (kind << 32) | value
+
+def frame(payload):
+    """Prefix a payload with its 2-byte big-endian length."""
+    return len(payload).to_bytes(2, 'big') + payload
+
+class UringChatServer:
+    """Constructor (sets host, port, TCP & IP, reuse options, default clients)"""
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        #Clients are keyed by their registered-file slot index
+        self.clients = {}
+        #Per-slot reassembly buffer for partial length-prefixed frames;
+        #an entry exists for every live connection, named or not
+        self.recv_bufs = {}
+        #fd_slots[slot] holds the raw fd registered in that slot, or None
+        self.fd_slots = [None] * MAX_CLIENTS
+        self.ring = liburing.io_uring()
+        #One buffer pool shared by all multishot recvs
+        self.buffers = bytearray(BUFFER_SIZE * BUFFER_COUNT)
+        log.debug("Server object created with host=%s, port=%s", host, port)
+
+    def get_sqe(self):
+        """Get a free SQE, flushing the submission queue if it is full."""
+        try:
+            sqe = liburing.io_uring_get_sqe(self.ring)
+        except Exception:
+            sqe = None
+        if not sqe:
+            #The ring has 256 SQ entries but up to MAX_CLIENTS recipients; a
+            #full queue just means it is time to submit what is batched
+            liburing.io_uring_submit(self.ring)
+            sqe = liburing.io_uring_get_sqe(self.ring)
+        return sqe
+
+    def broadcast(self, payload, sender_slot=None):
+        """Send an already-encoded payload to all connected clients except the sender."""
+        #Framed once for the whole fan-out, same wire format as chat_server
+        framed = frame(payload)
+        for slot in list(self.clients.keys()):
+            if slot != sender_slot:
+                try:
+                    sqe = self.get_sqe()
+                    #Slot index instead of raw fd: skips the kernel fdtable
+                    #lookup and refcount bump on every send
+                    liburing.io_uring_prep_send(sqe, slot, framed, len(framed), 0)
+                    sqe.flags |= liburing.IOSQE_FIXED_FILE
+                    sqe.user_data = tag(KIND_SEND)
+                except Exception as e:
+                    log.warning("Failed to queue send to client: %s", e)
+                    self.remove_client(slot)
+        #One submit for the whole fan-out instead of one syscall per recipient
+        liburing.io_uring_submit(self.ring)
+
+    def send_to(self, slot, payload):
+        """Queue one framed payload to a single client."""
+        framed = frame(payload)
+        sqe = self.get_sqe()
+        liburing.io_uring_prep_send(sqe, slot, framed, len(framed), 0)
+        sqe.flags |= liburing.IOSQE_FIXED_FILE
+        sqe.user_data = tag(KIND_SEND)
+        liburing.io_uring_submit(self.ring)
+
+    def remove_client(self, slot):
+        """Tear down a connection and free its registered-file slot."""
+        if slot not in self.recv_bufs:
+            return None
+        del self.recv_bufs[slot]
+        #A connection that never sent a nickname has no clients entry
+        nickname, _ = self.clients.pop(slot, (None, None))
+        fd = self.fd_slots[slot]
+        self.fd_slots[slot] = None
+        #Unregister by writing -1 into the slot
+        liburing.io_uring_register_files_update(self.ring, slot, [-1])
+        try:
+            socket.close(fd)
+        except OSError:
+            pass
+        if nickname:
+            log.debug("Removed client: %s", nickname)
+        return nickname
+
+    def register_client(self, fd):
+        """Pin fd into the lowest free registered-file slot; returns the slot."""
+        for slot, occupant in enumerate(self.fd_slots):
+            if occupant is None:
+                self.fd_slots[slot] = fd
+                self.recv_bufs[slot] = bytearray()
+                liburing.io_uring_register_files_update(self.ring, slot, [fd])
+                return slot
+        return None
+
+    def arm_recv(self, slot):
+        """Arm one multishot recv; the kernel re-arms itself after each message."""
+        sqe = self.get_sqe()
+        liburing.io_uring_prep_recv_multishot(sqe, slot, None, 0, 0)
+        sqe.flags |= liburing.IOSQE_BUFFER_SELECT | liburing.IOSQE_FIXED_FILE
+        sqe.buf_group = BUFFER_GROUP
+        sqe.user_data = tag(KIND_RECV, slot)
+        liburing.io_uring_submit(self.ring)
+
+    def on_data(self, slot, data):
+        """Buffer received bytes and dispatch every complete frame."""
+        buf = self.recv_bufs[slot]
+        buf += data
+        offset = 0
+        while len(buf) - offset >= 2:
+            length = int.from_bytes(buf[offset:offset + 2], 'big')
+            if len(buf) - offset < 2 + length:
+                break
+            payload = bytes(buf[offset + 2:offset + 2 + length])
+            offset += 2 + length
+            self.on_message(slot, payload)
+            #A /quit inside the batch tears the connection down mid-parse
+            if slot not in self.recv_bufs:
+                return
+        #Compact any partial-frame residue to the front of the buffer
+        del buf[:offset]
+
+    def on_message(self, slot, payload):
+        """Handle one complete message from a client."""
+        if slot not in self.clients:
+            #First frame from a new connection is the nickname
+            nickname = payload.decode('utf-8').strip()
+            if not nickname:
+                nickname = f"User_{slot}"
+            #Bound the nickname so the cached prefix and notices always frame
+            nickname = nickname[:MAX_NICKNAME]
+            #"[nickname] " encoded once at join; relayed messages reuse it
+            self.clients[slot] = (nickname, f"[{nickname}] ".encode('utf-8'))
+            log.debug("Added %s to clients dict. Total clients: %d", nickname, len(self.clients))
+            log.info("*** %s has joined the chat ***", nickname)
+            self.broadcast(f"*** {nickname} has joined the chat ***".encode('utf-8'), slot)
+            return
+
+        nickname, prefix = self.clients[slot]
+        stripped = payload.strip()
+
+        if stripped.lower() == b'/quit':
+            self.on_disconnect(slot)
+            return
+
+        #The relayed frame carries the prefix too; a payload that overflows
+        #the header must be refused, not let it raise
+        if len(prefix) + len(stripped) > MAX_FRAME:
+            self.send_to(slot, TOO_LONG_MSG)
+            return
+
+        log.debug("[%s] %s", nickname, stripped)
+        #Cached prefix plus the raw payload: the relay never decodes
+        self.broadcast(prefix + stripped, slot)
+
+    def on_disconnect(self, slot):
+        nickname = self.remove_client(slot)
+        if nickname:
+            log.info("*** %s has left the chat ***", nickname)
+            self.broadcast(f"*** {nickname} has left the chat ***".encode('utf-8'))
+
+    def start(self):
+        """Start the chat server."""
+        try:
+            self.server_socket.bind((self.host, self.port))
+            self.server_socket.listen(10)
+            server_fd = self.server_socket.fileno()
+
+            #DEFER_TASKRUN + SINGLE_ISSUER let the kernel batch completion work
+            liburing.io_uring_queue_init(
+                256, self.ring,
+                liburing.IORING_SETUP_DEFER_TASKRUN | liburing.IORING_SETUP_SINGLE_ISSUER)
+
+            #Sparse registered-file table; clients claim slots as they connect
+            liburing.io_uring_register_files(self.ring, [-1] * MAX_CLIENTS)
+
+            #Hand the ring a pool of buffers for multishot recv to fill
+            sqe = self.get_sqe()
+            liburing.io_uring_prep_provide_buffers(
+                sqe, self.buffers, BUFFER_SIZE, BUFFER_COUNT, BUFFER_GROUP, 0)
+            liburing.io_uring_submit(self.ring)
+
+            #Multishot accept: one SQE yields a CQE per incoming connection
+            sqe = self.get_sqe()
+            liburing.io_uring_prep_multishot_accept(sqe, server_fd, None, None, 0)
+            sqe.user_data = tag(KIND_ACCEPT)
+            liburing.io_uring_submit(self.ring)
+
+            print(f"\n{'='*50}")
+            print(f"Chat server (io_uring) started on {self.host}:{self.port}")
+            print(f"Waiting for clients to connect...")
+            print(f"{'='*50}\n")
+
+            cqe = liburing.io_uring_cqe()
+            while True:
+                liburing.io_uring_wait_cqe(self.ring, cqe)
+                while True:
+                    kind = cqe.user_data >> 32
+                    value = cqe.user_data & 0xFFFFFFFF
+                    #Per-completion boundary: a bad message (e.g. invalid
+                    #UTF-8 in a nickname) costs that client its connection,
+                    #never the whole server — same contract as the asyncio
+                    #server's per-connection handler
+                    try:
+                        if kind == KIND_ACCEPT:
+                            #New connection: cqe.res is the accepted fd
+                            client_fd = cqe.res
+                            slot = self.register_client(client_fd)
+                            if slot is None:
+                                log.warning("Rejecting fd=%d: slot table full", client_fd)
+                                socket.close(client_fd)
+                            else:
+                                log.debug("New connection (fd=%d, slot=%d)", client_fd, slot)
+                                self.arm_recv(slot)
+                        elif kind == KIND_RECV:
+                            if cqe.res > 0:
+                                #Buffer id is packed in the CQE flags
+                                buf_id = cqe.flags >> liburing.IORING_CQE_BUFFER_SHIFT
+                                off = buf_id * BUFFER_SIZE
+                                data = bytes(self.buffers[off:off + cqe.res])
+                                #Hand the buffer straight back to the pool; without
+                                #this the pool drains for good after BUFFER_COUNT
+                                #messages and every recv fails with ENOBUFS
+                                sqe = self.get_sqe()
+                                liburing.io_uring_prep_provide_buffers(
+                                    sqe, memoryview(self.buffers)[off:off + BUFFER_SIZE],
+                                    BUFFER_SIZE, 1, BUFFER_GROUP, buf_id)
+                                liburing.io_uring_submit(self.ring)
+                                self.on_data(value, data)
+                                #No F_MORE means the kernel dropped the multishot;
+                                #re-arm instead of mistaking it for a hangup
+                                if (not (cqe.flags & liburing.IORING_CQE_F_MORE)
+                                        and value in self.recv_bufs):
+                                    self.arm_recv(value)
+                            elif cqe.res == -errno.ENOBUFS:
+                                #Pool was momentarily empty; buffers have been
+                                #re-provided above, so just re-arm the recv
+                                if value in self.recv_bufs:
+                                    self.arm_recv(value)
+                            else:
+                                self.on_disconnect(value)
+                    except Exception as e:
+                        log.warning("Error handling completion for slot %d: %s", value, e)
+                        if kind == KIND_RECV:
+                            self.remove_client(value)
+                    liburing.io_uring_cqe_seen(self.ring, cqe)
+                    #Drain any further completions without another syscall
+                    if liburing.io_uring_peek_cqe(self.ring, cqe) != 0:
+                        break
+
+        except KeyboardInterrupt:
+            print("\nKeyboardInterrupt received")
+            print("Server shutting down...")
+        except OSError as e:
+            print(f"OSError: {e}")
+        finally:
+            liburing.io_uring_queue_exit(self.ring)
+            self.server_socket.close()
+            print(f"Server socket closed")
+
+def print_usage():
+    print("Usage: python uring_server.py <host> <port>")
+    print("Example: python uring_server.py 192.168.1.100 5000")
+
+if __name__ == "__main__":
+    if liburing is None:
+        print("Error: python-liburing is not installed.")
+        print("Install it with 'pip install liburing' or use chat_server.py instead.")
+        sys.exit(1)
+
+    if len(sys.argv) != 3:
+        print("Error: Host and port are required!")
+        print_usage()
+        sys.exit(1)
+
+    host = sys.argv[1]
+    try:
+        port = int(sys.argv[2])
+    except ValueError:
+        print(f"Error: Port must be a number, got '{sys.argv[2]}'")
+        print_usage()
+        sys.exit(1)
+
+    #Per-message diagnostics stay off unless CHAT_DEBUG=1 is set
+    debug = os.environ.get("CHAT_DEBUG") == "1"
+    logging.basicConfig(level=logging.DEBUG if debug else logging.WARNING)
+    server = UringChatServer(host=host, port=port)
+    server.start()